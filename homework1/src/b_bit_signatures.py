@@ -0,0 +1,71 @@
+import numpy as np
+
+from compare_signatures import CompareSignatures
+from hashing import mix64
+
+# signatures cut down to the lowest b bits of every (remixed) value, bit-packed 64 // b values per uint64 word.
+# Indexing unpacks rows back into a (rows, num_hashes) matrix of b-bit values, so LSH can band over the
+# store directly, and CompareSignatures.pairwise_similarity uses the popcount estimate below
+class BBitSignatures:
+    BITS = (1, 2, 4, 8, 16, 32)
+
+    def __init__(self, words, b, num_hashes):
+        self.words = words # (num_docs, num_words) uint64
+        self.b = b
+        self.num_hashes = num_hashes
+
+    @staticmethod
+    def from_signatures(signature_matrix, b):
+        if b not in BBitSignatures.BITS:
+            raise ValueError(f"b must be one of {BBitSignatures.BITS}")
+        signature_matrix = np.asarray(signature_matrix)
+        num_docs, num_hashes = signature_matrix.shape
+        per_word = 64 // b
+        num_words = -(-num_hashes // per_word)
+        values = np.zeros((num_docs, num_words * per_word), dtype=np.uint64)
+        # MinHash values are remixed first: with an even `a` the raw low bits of (a * x + b) % 2**32 are the
+        # same for every doc, which would make unrelated docs agree on them
+        values[:, :num_hashes] = mix64(signature_matrix) & np.uint64((1 << b) - 1)
+        shifts = (np.arange(per_word, dtype=np.uint64) * np.uint64(b))
+        words = np.bitwise_or.reduce(values.reshape(num_docs, num_words, per_word) << shifts, axis=2)
+        return BBitSignatures(words, b, num_hashes)
+
+    @property
+    def shape(self):
+        return len(self.words), self.num_hashes
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes
+
+    def __len__(self):
+        return len(self.words)
+
+    def _unpack(self, words):
+        per_word = 64 // self.b
+        shifts = (np.arange(per_word, dtype=np.uint64) * np.uint64(self.b))
+        values = (words[..., None] >> shifts) & np.uint64((1 << self.b) - 1)
+        return values.reshape(*words.shape[:-1], -1)[..., :self.num_hashes].astype(np.uint32)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            rows, columns = key
+            return self._unpack(self.words[rows])[..., columns]
+        return self._unpack(self.words[key])
+
+    def similarity(self, i, j):
+        return float(CompareSignatures.b_bit_similarity(self.words[i], self.words[j], self.b, self.num_hashes))
+
+    def pairwise_similarity(self, pairs, batch_size=1 << 16):
+        return self.cross_similarity(pairs[:, 0], self, pairs[:, 1], batch_size)
+
+    # rows of this store against rows of another b-bit store with the same b and hash family
+    def cross_similarity(self, rows, other, other_rows, batch_size=1 << 16):
+        if other.b != self.b or other.num_hashes != self.num_hashes:
+            raise ValueError("both stores must keep the same b and number of hashes")
+        similarities = np.empty(len(rows), dtype=np.float64)
+        for start in range(0, len(rows), batch_size):
+            similarities[start:start + batch_size] = CompareSignatures.b_bit_similarity(
+                self.words[rows[start:start + batch_size]], other.words[other_rows[start:start + batch_size]],
+                self.b, self.num_hashes)
+        return similarities
@@ -1,6 +1,58 @@
+import numpy as np
+from scipy import sparse
+
+from shingle_corpus import ShingleCorpus
+
 class CompareSets:
     @staticmethod
     def jaccard_similarity(set1, set2):
         intersection = set1.intersection(set2)
         union = set1.union(set2)
         return len(intersection) / len(union) if len(union) > 0 else 0
+
+    # binary doc x shingle CSR matrix, shingles (strings or hashes) are numbered in order of first appearance
+    @staticmethod
+    def shingle_matrix(shingle_sets):
+        if isinstance(shingle_sets, ShingleCorpus):
+            return shingle_sets.to_csr()
+        return ShingleCorpus.from_shingle_sets(shingle_sets).to_csr()
+
+    # exact jaccard of every pair (i < j) sharing at least one shingle, one block of rows at a time
+    @staticmethod
+    def _pair_blocks(matrix, block_size):
+        if isinstance(matrix, ShingleCorpus):
+            matrix = matrix.to_csr()
+        matrix = sparse.csr_matrix(matrix, dtype=np.int32)
+        sizes = np.diff(matrix.indptr)
+        transposed = matrix.T.tocsr()
+        for start in range(0, matrix.shape[0], block_size):
+            intersections = (matrix[start:start + block_size] @ transposed).tocoo()
+            i = intersections.row.astype(np.int64) + start
+            j = intersections.col.astype(np.int64)
+            upper = j > i
+            i, j, inter = i[upper], j[upper], intersections.data[upper]
+            yield i, j, inter / (sizes[i] + sizes[j] - inter)
+
+    # all pairs with jaccard >= threshold, as a (num_pairs, 2) array of row indices
+    @staticmethod
+    def similar_pairs(matrix, threshold, block_size=1000):
+        if threshold <= 0:
+            raise ValueError("threshold must be > 0, pairs without common shingles are never produced")
+        pairs = [np.column_stack((i, j))[similarities >= threshold]
+                 for i, j, similarities in CompareSets._pair_blocks(matrix, block_size)]
+        return np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+
+    # histogram of the jaccard similarity of all n * (n - 1) / 2 pairs, over `bins` equal bins of [0, 1]
+    @staticmethod
+    def similarity_histogram(matrix, bins=100, block_size=1000):
+        if isinstance(matrix, ShingleCorpus):
+            matrix = matrix.to_csr()
+        edges = np.linspace(0, 1, bins + 1)
+        counts = np.zeros(bins, dtype=np.int64)
+        found = 0
+        for _, _, similarities in CompareSets._pair_blocks(matrix, block_size):
+            counts += np.histogram(similarities, bins=edges)[0]
+            found += len(similarities)
+        n = matrix.shape[0]
+        counts[0] += n * (n - 1) // 2 - found # pairs without a common shingle have similarity 0
+        return counts, edges
@@ -1,5 +1,104 @@
+from statistics import NormalDist
+
+import numpy as np
+
+from hashing import popcount64
+
 class CompareSignatures:
     @staticmethod
     def signature_similarity(sig1, sig2):
         match_count = sum(1 for i in range(len(sig1)) if sig1[i] == sig2[i])
-        return match_count / len(sig1)
\ No newline at end of file
+        return match_count / len(sig1)
+
+    # similarity of many (i, j) row pairs of a signature matrix, compared in batches
+    @staticmethod
+    def pairwise_similarity(signature_matrix, pairs, batch_size=1 << 16):
+        if hasattr(signature_matrix, 'pairwise_similarity'): # compact stores compare themselves
+            return signature_matrix.pairwise_similarity(pairs, batch_size)
+        similarities = np.empty(len(pairs), dtype=np.float64)
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            similarities[start:start + batch_size] = (signature_matrix[batch[:, 0]] == signature_matrix[batch[:, 1]]).mean(axis=1)
+        return similarities
+
+    # similarity of row r_rows[k] of r_matrix with row s_rows[k] of s_matrix, e.g. the two sides of an R-S join.
+    # Both matrices have to come from the same kind of store
+    @staticmethod
+    def cross_similarity(r_matrix, r_rows, s_matrix, s_rows, batch_size=1 << 16):
+        if hasattr(r_matrix, 'cross_similarity'):
+            return r_matrix.cross_similarity(r_rows, s_matrix, s_rows, batch_size)
+        similarities = np.empty(len(r_rows), dtype=np.float64)
+        for start in range(0, len(r_rows), batch_size):
+            r_batch, s_batch = r_rows[start:start + batch_size], s_rows[start:start + batch_size]
+            similarities[start:start + batch_size] = (np.asarray(r_matrix[r_batch]) == np.asarray(s_matrix[s_batch])).mean(axis=1)
+        return similarities
+
+    # jaccard estimate of b-bit signatures packed 64 // b values per uint64 word, rows may be batched
+    @staticmethod
+    def b_bit_similarity(words1, words2, b, num_hashes):
+        x = np.bitwise_xor(words1, words2)
+        differs = x.copy()
+        for shift in range(1, b): # fold every b-bit field onto its lowest bit
+            differs |= x >> np.uint64(shift)
+        low_bits = np.uint64(sum(1 << offset for offset in range(0, 64, b)))
+        mismatches = popcount64(differs & low_bits).sum(axis=-1, dtype=np.int64)
+        matches = 1 - mismatches / num_hashes
+        # two random b-bit values agree with probability 2**-b, take that share out (Li & Konig)
+        chance = 2.0 ** -b
+        return np.clip((matches - chance) / (1 - chance), 0, 1)
+
+    # bits that differ between packed uint64 fingerprints, rows may be batched
+    @staticmethod
+    def hamming_distance(words1, words2):
+        return popcount64(np.bitwise_xor(words1, words2)).sum(axis=-1, dtype=np.int64)
+
+    # estimate the histogram of signature similarity over all n * (n - 1) / 2 pairs without comparing them all.
+    # The pairs are split in two strata: LSH candidates (where the rare high similarities are), sampled up to
+    # candidate_samples, and all other pairs, sampled uniformly. Per stratum, bin shares are scaled to the
+    # stratum size; the normal approximation gives the confidence interval of every bin count
+    @staticmethod
+    def estimate_similarity_histogram(signature_matrix, lsh, bins=100, random_samples=100000,
+                                      candidate_samples=100000, confidence=0.95, seed=0):
+        rng = np.random.default_rng(seed)
+        n = len(signature_matrix)
+        edges = np.linspace(0, 1, bins + 1)
+        counts = np.zeros(bins)
+        variances = np.zeros(bins)
+
+        candidates = lsh.candidate_pairs(signature_matrix)
+        candidate_codes = candidates[:, 0] * n + candidates[:, 1]
+        strata = []
+        if len(candidates) > candidate_samples:
+            strata.append((len(candidates), candidates[rng.choice(len(candidates), candidate_samples, replace=False)], True))
+        elif len(candidates):
+            strata.append((len(candidates), candidates, True))
+
+        others = n * (n - 1) // 2 - len(candidates)
+        if others > 0 and random_samples > 0:
+            sampled = []
+            for _ in range(100): # rejection sampling of uniform pairs that are not candidates
+                i = rng.integers(0, n, size=random_samples)
+                j = rng.integers(0, n - 1, size=random_samples)
+                j += j >= i
+                i, j = np.minimum(i, j), np.maximum(i, j)
+                is_candidate = np.isin(i * n + j, candidate_codes) if len(candidate_codes) else np.zeros(len(i), dtype=bool)
+                sampled.append(np.column_stack((i, j))[~is_candidate])
+                if sum(map(len, sampled)) >= random_samples:
+                    break
+            strata.append((others, np.concatenate(sampled)[:random_samples], False))
+
+        for size, pairs, without_replacement in strata:
+            if len(pairs) == 0:
+                continue
+            shares = np.histogram(CompareSignatures.pairwise_similarity(signature_matrix, pairs), bins=edges)[0] / len(pairs)
+            correction = (size - len(pairs)) / (size - 1) if without_replacement and size > 1 else 1.0
+            counts += size * shares
+            variances += size ** 2 * shares * (1 - shares) / len(pairs) * correction
+
+        margin = NormalDist().inv_cdf((1 + confidence) / 2) * np.sqrt(variances)
+        return {
+            'edges': edges,
+            'counts': counts,
+            'lower': np.maximum(counts - margin, 0),
+            'upper': counts + margin,
+        }
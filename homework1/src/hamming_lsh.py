@@ -0,0 +1,61 @@
+import numpy as np
+
+from lsh import LSH
+from simhash import SimHashFingerprints
+
+# bit sampling LSH for simhash fingerprints: every band is keyed on bits_per_band fingerprint bits picked at
+# random, so two fingerprints at hamming distance d share a band with probability (1 - d / num_bits)^bits_per_band.
+# Candidate generation, oversized buckets and clustering are inherited from LSH, verification goes through
+# SimHashFingerprints.pairwise_similarity. Raw (num_docs, num_bits // 64) word arrays are wrapped into
+# SimHashFingerprints on entry, so they are never compared as plain signature rows
+class HammingLSH(LSH):
+    def __init__(self, num_bits, bands, bits_per_band, max_bucket_size=None, oversized='sample', seed=0):
+        if bits_per_band > 64:
+            raise ValueError("bits_per_band can be at most 64")
+        super().__init__(bands, bits_per_band, max_bucket_size, oversized, seed)
+        self.num_bits = num_bits
+        rng = np.random.default_rng(seed)
+        self.positions = np.stack([rng.choice(num_bits, bits_per_band, replace=False) for _ in range(bands)])
+
+    # the sampled bits of one band of a block of fingerprint words, packed into one uint64 key per row
+    def _band_keys(self, block, band_index):
+        positions = self.positions[band_index]
+        bits = (block[:, positions // 64] >> (positions % 64).astype(np.uint64)) & np.uint64(1)
+        return np.bitwise_or.reduce(bits << np.arange(self.rows, dtype=np.uint64), axis=1)
+
+    def hash_bands(self, fingerprints, block_size=1 << 18):
+        words = getattr(fingerprints, 'words', fingerprints)
+        keys = np.empty((len(words), self.bands), dtype=np.uint64)
+        for start in range(0, len(words), block_size):
+            block = np.asarray(words[start:start + block_size])
+            for band_index in range(self.bands):
+                keys[start:start + len(block), band_index] = self._band_keys(block, band_index)
+        return keys
+
+    # 'split' sub-buckets on the next band's sampled bits, not on word columns of the fingerprints
+    def _sub_bucket_keys(self, docs, band_index, fingerprints):
+        words = np.asarray(getattr(fingerprints, 'words', fingerprints)[docs])
+        return self._band_keys(words, (band_index + 1) % self.bands)[:, None]
+
+    def _fingerprints(self, fingerprints):
+        if isinstance(fingerprints, SimHashFingerprints):
+            return fingerprints
+        words = np.asarray(fingerprints, dtype=np.uint64)
+        if words.ndim != 2 or words.shape[1] * 64 != self.num_bits:
+            raise ValueError(f"expected SimHashFingerprints or a (num_docs, {self.num_bits // 64}) uint64 word array")
+        return SimHashFingerprints(words, self.num_bits)
+
+    def _similar_pairs(self, fingerprints, threshold):
+        return super()._similar_pairs(self._fingerprints(fingerprints), threshold)
+
+    def cluster(self, fingerprints, threshold, representatives=4):
+        return super().cluster(self._fingerprints(fingerprints), threshold, representatives)
+
+    def join(self, r_fingerprints, s_batches, threshold, r_doc_ids=None, batch_size=1 << 16):
+        s_batches = ((s_doc_ids, self._fingerprints(s_fingerprints)) for s_doc_ids, s_fingerprints in s_batches)
+        return super().join(self._fingerprints(r_fingerprints), s_batches, threshold, r_doc_ids, batch_size)
+
+    # pairs of rows within max_distance bits of each other, as a (num_pairs, 2) array
+    def find_near_duplicates(self, fingerprints, max_distance):
+        _, pairs = self._similar_pairs(fingerprints, 1 - max_distance / self.num_bits)
+        return pairs
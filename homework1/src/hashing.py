@@ -0,0 +1,20 @@
+import numpy as np
+
+# murmur3 fmix64 finalizer, spreads every input bit over the whole 64-bit word
+def mix64(x):
+    x = np.asarray(x, dtype=np.uint64).copy()
+    x ^= x >> np.uint64(33)
+    x *= np.uint64(0xff51afd7ed558ccd)
+    x ^= x >> np.uint64(33)
+    x *= np.uint64(0xc4ceb9fe1a85ec53)
+    x ^= x >> np.uint64(33)
+    return x
+
+# number of set bits of every uint64
+def popcount64(x):
+    x = np.asarray(x, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'): # numpy >= 2.0
+        return np.bitwise_count(x)
+    return _BYTE_POPCOUNT[x[..., None].view(np.uint8)].sum(axis=-1, dtype=np.uint8)
+
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
@@ -0,0 +1,33 @@
+import pandas as pd
+
+# yield (doc_ids, documents) chunks of a csv file (text taken from `column`) or of a line-delimited text
+# file, doc ids are row / line numbers. Only one chunk is held in memory at a time
+def read_documents(path, column='title', chunk_size=10000):
+    if path.endswith('.csv'):
+        for chunk in pd.read_csv(path, usecols=[column], chunksize=chunk_size):
+            yield chunk.index.tolist(), chunk[column].fillna('').astype(str).tolist()
+        return
+
+    doc_ids, documents = [], []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f):
+            doc_ids.append(line_number)
+            documents.append(line.rstrip('\n'))
+            if len(documents) == chunk_size:
+                yield doc_ids, documents
+                doc_ids, documents = [], []
+    if documents:
+        yield doc_ids, documents
+
+# push every chunk through shingling -> minhashing -> index / store insertion and yield
+# (doc_ids, signature_matrix) per chunk, peak memory follows chunk_size, not the corpus size. A store refuses
+# chunks signed by another hash family than the one it holds
+def ingest(path, shingling, minhash, index=None, store=None, column='title', chunk_size=10000):
+    for doc_ids, documents in read_documents(path, column, chunk_size):
+        hashed_shingles = [shingling.hash_document(document) for document in documents]
+        signature_matrix = minhash.generate_signature_matrix(hashed_shingles)
+        if index is not None:
+            index.insert_many(doc_ids, signature_matrix)
+        if store is not None:
+            store.append(doc_ids, signature_matrix, hashed_shingles if store.meta['with_shingles'] else None, minhash)
+        yield doc_ids, signature_matrix
@@ -1,32 +1,237 @@
 import hashlib
+import time
+
+import numpy as np
 
 from compare_signatures import CompareSignatures
+from hashing import mix64
+from union_find import UnionFind
 
 class LSH:
-    def __init__(self, bands, rows):
+    PRIME = np.uint64(0x9e3779b97f4a7c15) # multiplier used to combine the rows of a band
+
+    OVERSIZED_POLICIES = ('sample', 'split', 'cluster')
+
+    def __init__(self, bands, rows, max_bucket_size=None, oversized='sample', seed=0):
+        if oversized not in self.OVERSIZED_POLICIES:
+            raise ValueError(f"oversized must be one of {self.OVERSIZED_POLICIES}")
         self.bands = bands # bands count
         self.rows = rows # rows of each bands
+        # buckets with more docs than max_bucket_size are not expanded into all pairs:
+        # 'sample' keeps a random sample of max_bucket_size docs, 'split' sub-buckets the docs on the
+        # next band's rows (sampling what is still too big), 'cluster' links every doc to the first one only
+        self.max_bucket_size = max_bucket_size
+        self.oversized = oversized
+        self.rng = np.random.default_rng(seed)
+        self.bucket_stats = {} # bucket size statistics of the last candidate_pairs call
 
     # hash the band, return value
     def hash_band(self, band):
         return hashlib.sha1("".join(map(str, band)).encode()).hexdigest()
 
+    # hash every band of every doc at once, return a (num_docs, bands) uint64 matrix
+    def hash_bands(self, signature_matrix, block_size=1 << 18):
+        num_docs = len(signature_matrix)
+        band_hashes = np.empty((num_docs, self.bands), dtype=np.uint64)
+        for start in range(0, num_docs, block_size): # row blocks, so memory-mapped matrices are read piecewise
+            block = np.asarray(signature_matrix[start:start + block_size]).astype(np.uint64)
+            for band_index in range(self.bands):
+                h = np.full(len(block), band_index, dtype=np.uint64)
+                for row in range(band_index * self.rows, (band_index + 1) * self.rows):
+                    h *= self.PRIME
+                    h += block[:, row]
+                band_hashes[start:start + len(block), band_index] = mix64(h)
+        return band_hashes
+
+    # sort each band's hashes, yield (band_index, order, starts, sizes) of the runs of equal hashes
+    @staticmethod
+    def _bucket_runs(band_hashes):
+        for band_index in range(band_hashes.shape[1]):
+            column = band_hashes[:, band_index]
+            order = np.argsort(column, kind='stable') # stable, so doc indices stay increasing inside a bucket
+            sorted_hashes = column[order]
+            starts = np.flatnonzero(np.r_[True, sorted_hashes[1:] != sorted_hashes[:-1]])
+            sizes = np.diff(np.r_[starts, len(order)])
+            yield band_index, order, starts, sizes
+
+    # group docs with equal band hashes by sorting, yield the doc indices of every bucket holding > 1 doc
+    @staticmethod
+    def buckets(band_hashes):
+        for _, order, starts, sizes in LSH._bucket_runs(band_hashes):
+            for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+                yield order[start:start + size]
+
+    @staticmethod
+    def _all_pairs(docs):
+        left, right = np.triu_indices(len(docs), k=1)
+        return docs[left], docs[right]
+
+    def _sample_pairs(self, docs):
+        if len(docs) > self.max_bucket_size:
+            docs = np.sort(self.rng.choice(docs, self.max_bucket_size, replace=False))
+        return self._all_pairs(docs)
+
+    # (len(docs), k) keys 'split' sub-buckets an oversized bucket of band band_index on: the next band's rows
+    def _sub_bucket_keys(self, docs, band_index, signature_matrix):
+        next_band = (band_index + 1) % self.bands
+        return np.asarray(signature_matrix[docs, next_band * self.rows:(next_band + 1) * self.rows])
+
+    # candidate (i, j) arrays for one bucket above max_bucket_size
+    def _oversized_pairs(self, docs, band_index, signature_matrix):
+        if self.oversized == 'cluster':
+            return np.full(len(docs) - 1, docs[0]), docs[1:]
+        if self.oversized == 'sample':
+            return self._sample_pairs(docs)
+
+        _, sub_buckets = np.unique(self._sub_bucket_keys(docs, band_index, signature_matrix), axis=0, return_inverse=True)
+        sub_buckets = sub_buckets.ravel()
+        order = docs[np.argsort(sub_buckets, kind='stable')] # runs of equal sub-buckets, docs still increasing
+        sizes = np.bincount(sub_buckets)
+        starts = np.r_[0, np.cumsum(sizes)[:-1]]
+        i, j = self._expand_runs(order, starts, sizes, self.max_bucket_size)
+        for start, size in zip(starts[sizes > self.max_bucket_size], sizes[sizes > self.max_bucket_size]):
+            sampled_i, sampled_j = self._sample_pairs(order[start:start + size])
+            i.append(sampled_i)
+            j.append(sampled_j)
+        return np.concatenate(i), np.concatenate(j)
+
+    # all pairs of the runs order[start:start + size] with 1 < size <= limit, runs of the same size are
+    # expanded at once. Return lists of i and j arrays
+    @staticmethod
+    def _expand_runs(order, starts, sizes, limit):
+        i, j = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        shared = (sizes > 1) & (sizes <= limit)
+        for size in np.unique(sizes[shared]):
+            left, right = np.triu_indices(size, k=1)
+            run_starts = starts[sizes == size][:, None]
+            i.append(order[run_starts + left].ravel())
+            j.append(order[run_starts + right].ravel())
+        return i, j
+
+    # candidate (i, j) arrays, i < j, band by band. Pairs are only unique within a band; bucket_stats is
+    # filled in once the last band has been produced
+    def band_candidate_pairs(self, signature_matrix):
+        num_docs = len(signature_matrix)
+        limit = self.max_bucket_size if self.max_bucket_size is not None else num_docs
+        all_sizes = []
+        for band_index, order, starts, sizes in self._bucket_runs(self.hash_bands(signature_matrix)):
+            band_i, band_j = self._expand_runs(order, starts, sizes, limit)
+            for start, size in zip(starts[sizes > limit], sizes[sizes > limit]):
+                i, j = self._oversized_pairs(order[start:start + size], band_index, signature_matrix)
+                band_i.append(i)
+                band_j.append(j)
+            all_sizes.append(sizes[sizes > 1])
+            yield np.concatenate(band_i), np.concatenate(band_j)
+
+        all_sizes = np.concatenate(all_sizes) if all_sizes else np.empty(0, dtype=np.int64)
+        self.bucket_stats = {
+            'buckets': len(all_sizes), # buckets holding > 1 doc, over all bands
+            'max_size': int(all_sizes.max()) if len(all_sizes) else 0,
+            'mean_size': float(all_sizes.mean()) if len(all_sizes) else 0.0,
+            'p99_size': float(np.percentile(all_sizes, 99)) if len(all_sizes) else 0.0,
+            'oversized': int((all_sizes > limit).sum()),
+            'colliding_pairs': int((all_sizes * (all_sizes - 1) // 2).sum()), # pairs a full expansion would produce
+        }
+
+    # every (i, j), i < j, sharing a bucket in any band, deduplicated into a (num_candidates, 2) array
+    def candidate_pairs(self, signature_matrix):
+        num_docs = len(signature_matrix)
+        codes = np.empty(0, dtype=np.int64) # pair (i, j) is stored as i * num_docs + j
+        for i, j in self.band_candidate_pairs(signature_matrix):
+            codes = np.unique(np.concatenate((codes, i * num_docs + j)))
+        self.bucket_stats['candidates'] = len(codes)
+        return np.column_stack((codes // num_docs, codes % num_docs))
+
+    # verify the unique candidates in bulk, return (number of candidates, (num_pairs, 2) similar row pairs)
+    def _similar_pairs(self, signature_matrix, threshold):
+        candidates = self.candidate_pairs(signature_matrix)
+        similarities = CompareSignatures.pairwise_similarity(signature_matrix, candidates)
+        return len(candidates), candidates[similarities >= threshold]
+
     def find_similar_pairs(self, signatures, threshold):
         # (self, sig dic, 相似性阈值)
-        candidates = {} # A dic，store doc id with same hash value. <band_hash, [doc_id1, doc_id2, ...]>
-        for doc_id, signature in signatures.items():
-            for band_index in range(self.bands):
-                band = signature[band_index * self.rows: (band_index + 1) * self.rows] # set a band with length of 'rows'
-                band_hash = self.hash_band(band) # hash a band
-                if band_hash not in candidates:
-                    candidates[band_hash] = []
-                candidates[band_hash].append(doc_id)
-
-        similar_pairs = set()
-        for docs in candidates.values():
-            if len(docs) > 1: # doc num > 1
-                for i in range(len(docs)): # compute each pairs' similarity
-                    for j in range(i + 1, len(docs)):
-                        if CompareSignatures.signature_similarity(signatures[docs[i]], signatures[docs[j]]) >= threshold:
-                            similar_pairs.add((docs[i], docs[j]))
-        return similar_pairs
+        doc_ids = list(signatures.keys())
+        if len(doc_ids) == 0:
+            return set()
+        signature_matrix = np.asarray([signatures[doc_id] for doc_id in doc_ids])
+        _, similar_pairs = self._similar_pairs(signature_matrix, threshold)
+        return {(doc_ids[i], doc_ids[j]) for i, j in similar_pairs.tolist()}
+
+    # cluster id per row. Buckets are never expanded into all their pairs: in every bucket each member is
+    # verified against the bucket's first doc (its representative) and merged into a union-find, then the
+    # first member left unmerged becomes the next representative, for up to `representatives` rounds.
+    # Work and memory per round stay linear in the number of docs, however large a bucket is
+    def cluster(self, signature_matrix, threshold, representatives=4):
+        clusters = UnionFind(len(signature_matrix))
+        for _, order, starts, sizes in self._bucket_runs(self.hash_bands(signature_matrix)):
+            shared = sizes > 1
+            run_starts, run_sizes = starts[shared], sizes[shared]
+            members = order[np.repeat(run_starts, run_sizes) + np.arange(run_sizes.sum())
+                            - np.repeat(np.cumsum(run_sizes) - run_sizes, run_sizes)]
+            runs = np.repeat(np.arange(len(run_sizes)), run_sizes)
+            for _ in range(representatives):
+                first = np.r_[True, runs[1:] != runs[:-1]] if len(runs) else np.empty(0, dtype=bool)
+                heads = members[first][np.cumsum(first) - 1] # representative of every member's run
+                unmerged = clusters.roots(heads) != clusters.roots(members)
+                if not unmerged.any():
+                    break
+                pairs = np.column_stack((heads[unmerged], members[unmerged]))
+                similar = pairs[CompareSignatures.pairwise_similarity(signature_matrix, pairs) >= threshold]
+                clusters.union_pairs(similar[:, 0], similar[:, 1])
+                left = ~first & (clusters.roots(heads) != clusters.roots(members))
+                members, runs = members[left], runs[left]
+        return clusters.labels()
+
+    # R-S join: band R once, then stream (s_doc_ids, s_signature_matrix) batches against it and yield
+    # (r_doc_id, s_doc_id, similarity) for every cross pair reaching the threshold, r_doc_ids defaulting to
+    # the R row numbers. S is never kept, and pairs inside R or inside S are never generated. Both sides may
+    # be compact stores of the same kind, verification goes through CompareSignatures.cross_similarity
+    def join(self, r_signatures, s_batches, threshold, r_doc_ids=None, batch_size=1 << 16):
+        r_hashes = self.hash_bands(r_signatures)
+        orders = [np.argsort(r_hashes[:, band_index], kind='stable') for band_index in range(self.bands)]
+        sorted_hashes = [r_hashes[order, band_index] for band_index, order in enumerate(orders)]
+        del r_hashes
+
+        for s_doc_ids, s_matrix in s_batches:
+            if not hasattr(s_matrix, 'cross_similarity'):
+                s_matrix = np.asarray(s_matrix)
+            codes = [np.empty(0, dtype=np.int64)] # pair (r, s) is stored as r * len(s_matrix) + s
+            for band_index, band_hashes in enumerate(self.hash_bands(s_matrix).T):
+                left = np.searchsorted(sorted_hashes[band_index], band_hashes, side='left')
+                counts = np.searchsorted(sorted_hashes[band_index], band_hashes, side='right') - left
+                if self.max_bucket_size is not None: # a random window of an oversized R bucket
+                    excess = np.maximum(counts - self.max_bucket_size, 0)
+                    left += (self.rng.random(len(counts)) * (excess + 1)).astype(np.int64)
+                    counts -= excess
+                s_rows = np.repeat(np.arange(len(s_matrix)), counts)
+                offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                r_rows = orders[band_index][np.repeat(left, counts) + offsets]
+                codes.append(r_rows * len(s_matrix) + s_rows)
+            codes = np.unique(np.concatenate(codes))
+            r_rows, s_rows = codes // max(1, len(s_matrix)), codes % max(1, len(s_matrix))
+
+            similarities = CompareSignatures.cross_similarity(r_signatures, r_rows, s_matrix, s_rows, batch_size)
+            similar = similarities >= threshold
+            for r_row, s_row, similarity in zip(r_rows[similar].tolist(), s_rows[similar].tolist(),
+                                                similarities[similar].tolist()):
+                yield (r_row if r_doc_ids is None else r_doc_ids[r_row]), s_doc_ids[s_row], similarity
+
+    # evaluate several (bands, rows) configurations on one precomputed signature matrix
+    @staticmethod
+    def sweep(signature_matrix, configurations, threshold, max_bucket_size=None, oversized='sample'):
+        results = []
+        for bands, rows in configurations:
+            if bands * rows > signature_matrix.shape[1]:
+                raise ValueError(f"{bands} bands x {rows} rows need more than {signature_matrix.shape[1]} signature rows")
+            start = time.perf_counter()
+            lsh = LSH(bands, rows, max_bucket_size, oversized)
+            candidates, similar_pairs = lsh._similar_pairs(signature_matrix, threshold)
+            results.append({
+                'bands': bands,
+                'rows': rows,
+                'candidates': candidates,
+                'similar_pairs': similar_pairs,
+                'bucket_stats': lsh.bucket_stats,
+                'seconds': time.perf_counter() - start,
+            })
+        return results
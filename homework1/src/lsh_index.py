@@ -0,0 +1,134 @@
+import bisect
+import heapq
+import itertools
+import pickle
+
+import numpy as np
+
+from lsh import LSH
+
+class LSHIndex:
+    CANDIDATE_FACTOR = 4 # query_top_k stops shortening prefixes once this many candidates per result were found
+
+    def __init__(self, bands, rows, multi_probe=False):
+        self.lsh = LSH(bands, rows)
+        # one table per band, <band_hash, {doc_id, ...}>. With multi_probe the tables are keyed on the band's
+        # row tuple instead, and every band also gets its keys sorted (LSH Forest): the buckets sharing a
+        # shorter prefix of rows with a query are then one bisect away, without any extra table. The sorted
+        # keys are rebuilt lazily by the first query_top_k after inserts or removes changed the tables
+        self.multi_probe = multi_probe
+        self.tables = [{} for _ in range(bands)]
+        self.sorted_keys = [[] for _ in range(bands)] if multi_probe else []
+        self.keys_changed = False
+        self.band_hashes = {} # <doc_id, keys of the doc in every table>, needed to find the doc again on remove
+        self.signatures = {} # <doc_id, signature>
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.signatures
+
+    # keys of every doc of the batch in every band table, as a list per doc
+    def _hash(self, signature_matrix):
+        signature_matrix = np.asarray(signature_matrix)
+        if not self.multi_probe:
+            return self.lsh.hash_bands(signature_matrix).tolist()
+        bands, rows = self.lsh.bands, self.lsh.rows
+        band_rows = signature_matrix[:, :bands * rows].reshape(len(signature_matrix), bands, rows).tolist()
+        return [[tuple(key) for key in keys] for keys in band_rows]
+
+    def _add(self, doc_id, signature, band_hashes):
+        if doc_id in self.signatures: # re-inserting replaces the old signature
+            self.remove(doc_id)
+        for table, band_hash in zip(self.tables, band_hashes):
+            if band_hash not in table:
+                table[band_hash] = set()
+                self.keys_changed = True
+            table[band_hash].add(doc_id)
+        self.band_hashes[doc_id] = band_hashes
+        self.signatures[doc_id] = np.array(signature) # copy, a view would pin the whole batch in memory
+
+    def insert(self, doc_id, signature):
+        self._add(doc_id, signature, self._hash(np.asarray(signature)[None, :])[0])
+
+    # bulk insert, bands of the whole batch are hashed in one pass
+    def insert_many(self, doc_ids, signature_matrix):
+        for doc_id, signature, band_hashes in zip(doc_ids, signature_matrix, self._hash(signature_matrix)):
+            self._add(doc_id, signature, band_hashes)
+
+    def remove(self, doc_id):
+        band_hashes = self.band_hashes.pop(doc_id) # KeyError for unknown docs, like dict
+        del self.signatures[doc_id]
+        for table, band_hash in zip(self.tables, band_hashes):
+            bucket = table[band_hash]
+            bucket.discard(doc_id)
+            if not bucket:
+                del table[band_hash]
+                self.keys_changed = True
+
+    # ids of all docs sharing at least one band with the signature
+    def query(self, signature):
+        candidates = set()
+        for table, band_hash in zip(self.tables, self._hash(np.asarray(signature)[None, :])[0]):
+            candidates.update(table.get(band_hash, ()))
+        return candidates
+
+    # ids of the docs whose band band_index starts with the first `length` rows of key
+    def _prefix_matches(self, band_index, key, length):
+        table, keys = self.tables[band_index], self.sorted_keys[band_index]
+        prefix = key[:length]
+        docs = set()
+        for position in range(bisect.bisect_left(keys, prefix), len(keys)):
+            if keys[position][:length] != prefix:
+                break
+            docs.update(table[keys[position]])
+        return docs
+
+    # the k docs most similar to the signature as [(similarity, doc_id), ...], best first. Probes the exact
+    # buckets, then (multi_probe) the buckets sharing ever shorter prefixes of rows with each band, and stops
+    # as soon as the k-th best similarity reaches what any doc not found yet could still score, or enough
+    # candidates were seen
+    def query_top_k(self, signature, k):
+        signature = np.asarray(signature)
+        keys = self._hash(signature[None, :])[0]
+        bands, rows = self.lsh.bands, self.lsh.rows
+        lengths = range(rows, 0, -1) if self.multi_probe else [rows]
+        if self.multi_probe and self.keys_changed:
+            self.sorted_keys = [sorted(table) for table in self.tables]
+            self.keys_changed = False
+        # a doc missed so far differs in at least one row of every band
+        bound = 1 - bands / len(signature)
+
+        seen = set()
+        top = [] # min-heap of (similarity, arrival, doc_id) holding the best k so far, arrival breaks ties
+        arrival = itertools.count()
+        for length in lengths:
+            candidates = set()
+            for band_index, key in enumerate(keys):
+                if length == rows:
+                    candidates.update(self.tables[band_index].get(key, ()))
+                else:
+                    candidates.update(self._prefix_matches(band_index, key, length))
+            candidates = list(candidates - seen)
+            seen.update(candidates)
+            if candidates:
+                matrix = np.vstack([self.signatures[doc_id] for doc_id in candidates])
+                for doc_id, similarity in zip(candidates, (matrix == signature).mean(axis=1).tolist()):
+                    entry = (similarity, -next(arrival), doc_id)
+                    if len(top) < k:
+                        heapq.heappush(top, entry)
+                    elif similarity > top[0][0]:
+                        heapq.heapreplace(top, entry)
+            if len(top) == k and (top[0][0] >= bound or len(seen) >= self.CANDIDATE_FACTOR * k):
+                break
+        return [(similarity, doc_id) for similarity, _, doc_id in sorted(top, reverse=True)]
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
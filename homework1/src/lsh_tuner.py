@@ -0,0 +1,97 @@
+import time
+
+import numpy as np
+
+from compare_signatures import CompareSignatures
+from lsh import LSH
+
+# picks (bands, rows) for LSH from the S-curve P(candidate | s) = 1 - (1 - s^r)^b and, given a sample of
+# signatures, from the similarity and bucket-size distributions measured on that sample
+class LSHTuner:
+    def __init__(self, num_hashes, threshold, min_recall=0.9, band_cost=1e-8, candidate_cost=1e-7):
+        self.num_hashes = num_hashes
+        self.threshold = threshold
+        self.min_recall = min_recall
+        self.band_cost = band_cost # seconds to hash one band of one doc
+        self.candidate_cost = candidate_cost # seconds to verify one candidate pair
+        self.grid = np.linspace(0, 1, 1001)
+
+    # most bands possible for every band height r
+    def configurations(self):
+        return [(self.num_hashes // rows, rows) for rows in range(1, self.num_hashes + 1)]
+
+    @staticmethod
+    def s_curve(bands, rows, similarities):
+        return 1 - (1 - np.asarray(similarities, dtype=np.float64) ** rows) ** bands
+
+    # area under the S-curve below the threshold and above it under 1 - S-curve, each normalised to [0, 1]
+    def error_rates(self, bands, rows):
+        probabilities = self.s_curve(bands, rows, self.grid)
+        below = self.grid < self.threshold
+        false_positive = probabilities[below].mean() if below.any() else 0.0
+        false_negative = 1 - probabilities[~below].mean()
+        return float(false_positive), float(false_negative)
+
+    # measure band_cost and candidate_cost on the sample, so costs come out in seconds of this machine
+    def calibrate(self, sample):
+        rows = min(4, self.num_hashes) # bands of 4 rows, or one band of every row for tiny signatures
+        lsh = LSH(self.num_hashes // rows, rows)
+        start = time.perf_counter()
+        lsh.hash_bands(sample)
+        self.band_cost = (time.perf_counter() - start) / (len(sample) * lsh.bands)
+        pairs = np.random.default_rng(0).integers(0, len(sample), size=(100000, 2))
+        start = time.perf_counter()
+        CompareSignatures.pairwise_similarity(sample, pairs)
+        self.candidate_cost = (time.perf_counter() - start) / len(pairs)
+
+    @staticmethod
+    def _sample_similarities(sample, batch_size=1 << 18):
+        i, j = np.triu_indices(len(sample), k=1)
+        return CompareSignatures.pairwise_similarity(sample, np.column_stack((i, j)), batch_size)
+
+    # one report per configuration, cheapest first among those reaching min_recall. With a sample, recall is
+    # the mean S-curve over sample pairs at or above the threshold and candidates come from banding the sample,
+    # scaled by the number of pairs of corpus_size docs
+    def tune(self, sample=None, corpus_size=None, calibrate=True):
+        similar = None
+        if sample is not None:
+            sample = np.asarray(sample)
+            corpus_size = corpus_size or len(sample)
+            scale = corpus_size * (corpus_size - 1) / max(1, len(sample) * (len(sample) - 1))
+            similarities = self._sample_similarities(sample)
+            similar = similarities[similarities >= self.threshold]
+            if calibrate:
+                self.calibrate(sample)
+
+        reports = []
+        for bands, rows in self.configurations():
+            false_positive, false_negative = self.error_rates(bands, rows)
+            report = {
+                'bands': bands,
+                'rows': rows,
+                'false_positive_area': false_positive,
+                'false_negative_area': false_negative,
+                # worst case: probability that a pair right at the threshold becomes a candidate
+                'recall': float(self.s_curve(bands, rows, self.threshold)),
+            }
+            if similar is not None:
+                if len(similar):
+                    report['recall'] = float(self.s_curve(bands, rows, similar).mean())
+                lsh = LSH(bands, rows)
+                lsh.candidate_pairs(sample)
+                report['bucket_stats'] = lsh.bucket_stats
+                report['candidates'] = lsh.bucket_stats['candidates'] * scale
+                report['cost'] = corpus_size * bands * self.band_cost + report['candidates'] * self.candidate_cost
+            reports.append(report)
+
+        # configurations short of min_recall go last, best recall first
+        if similar is not None:
+            key = lambda report: (0, report['cost']) if report['recall'] >= self.min_recall else (1, -report['recall'])
+        else: # without a sample, trade the two error areas off
+            key = lambda report: ((0, report['false_positive_area'] + report['false_negative_area'])
+                                  if report['recall'] >= self.min_recall else (1, -report['recall']))
+        return sorted(reports, key=key)
+
+    def recommend(self, sample=None, corpus_size=None):
+        best = self.tune(sample, corpus_size)[0]
+        return best['bands'], best['rows']
@@ -27,14 +27,10 @@ documents = generator.choice(all_documents, n)
 sh = Shingling(k=5)
 shingling_tokens = list(map(lambda document: sh.generate_shingles(document), documents))
 
-similarities = []
-for i in range(n - 1):
-    token_1 = shingling_tokens[i]
-    for j in range(i + 1, n):
-        token_2 = shingling_tokens[j]
-        similarities.append(CompareSets.jaccard_similarity(token_1, token_2))
-
-sns.histplot(x=similarities, bins=100)
+shingle_matrix = CompareSets.shingle_matrix(shingling_tokens)
+counts, edges = CompareSets.similarity_histogram(shingle_matrix, bins=100)
+
+sns.histplot(x=edges[:-1], weights=counts, bins=edges)
 plt.xlabel("Similarity")
 plt.ylabel("Number of Pairs")
 plt.title("Distribution of Document Similarities")
@@ -53,36 +49,22 @@ generator = np.random.default_rng(seed=42)
 documents = generator.choice(all_documents, 1000)
 band_sizes = [5, 10, 20, 30, 40, 50]
 
-n_pairs = []
-approx_n_pairs = []
-
-for b in band_sizes:
-    # init MinHash and LSH instance
-    minhash = MinHashing(NUM_HASHES)
-    lsh = LSH(bands=b, rows=NUM_HASHES // b)
-
-    # generate sig dic
-    signatures = {}
-    for i, doc in enumerate(documents):
-        shingles = sh.generate_shingles(doc)
-        hashed_shingles = sh.hash_shingles(shingles)
-        signature = minhash.generate_signature(hashed_shingles)
-        signatures[i] = signature
-
-    # 使用 LSH 找到近似相似对
-    approx_similar_items = lsh.find_similar_pairs(signatures, threshold)
-    approx_n_pairs.append(len(approx_similar_items))
-
-    # 使用精确 Jaccard 相似度计算相似对的数量
-    true_similar_items = set()
-    for i in range(len(documents)):
-        for j in range(i + 1, len(documents)):
-            shingles_i = sh.generate_shingles(documents[i])
-            shingles_j = sh.generate_shingles(documents[j])
-            similarity = CompareSets.jaccard_similarity(shingles_i, shingles_j)
-            if similarity >= threshold:
-                true_similar_items.add((i, j))
-    n_pairs.append(len(true_similar_items))
+# 使用精确 Jaccard 相似度计算相似对的数量, 与 band size 无关, 只算一次
+shingle_matrix = CompareSets.shingle_matrix([sh.generate_shingles(doc) for doc in documents])
+true_similar_items = CompareSets.similar_pairs(shingle_matrix, threshold)
+
+# signatures are computed once, only the banding changes between band sizes
+minhash = MinHashing(NUM_HASHES, seed=42)
+signature_matrix = minhash.generate_signature_matrix([sh.hash_document(doc) for doc in documents])
+
+# 使用 LSH 找到近似相似对
+results = LSH.sweep(signature_matrix, [(b, NUM_HASHES // b) for b in band_sizes], threshold)
+for result in results:
+    print(f"b={result['bands']} r={result['rows']}: {result['candidates']} candidates, "
+          f"{len(result['similar_pairs'])} similar pairs, {result['seconds']:.3f}s")
+
+n_pairs = [len(true_similar_items)] * len(band_sizes)
+approx_n_pairs = [len(result['similar_pairs']) for result in results]
 
 # 绘制结果
 plt.plot(band_sizes, n_pairs, label='True Similar Items')
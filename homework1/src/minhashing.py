@@ -1,13 +1,28 @@
-import random
+from functools import partial
+
+import numpy as np
+
+from shingle_corpus import ShingleCorpus
+
+def _hash(a, b, x):
+    return (a * int(x, 16) + b) % 2**32
 
 class MinHashing:
-    def __init__(self, num_hashes):
+    MAX_HASH = 2**32 - 1
+
+    def __init__(self, num_hashes, seed=None):
         self.num_hashes = num_hashes # num of hash functions
-        self.hash_functions = [self._create_hash_function() for _ in range(num_hashes)]
+        # signatures are only comparable between instances with the same seed, None draws a fresh family
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy % 2**63)
+        rng = np.random.default_rng(self.seed)
+        # coefficients of the hash family h(x) = (a * x + b) % 2**32
+        self.a = rng.integers(1, 1001, size=num_hashes).astype(np.uint64)
+        self.b = rng.integers(1, 1001, size=num_hashes).astype(np.uint64)
+        self.hash_functions = [self._create_hash_function(int(a), int(b)) for a, b in zip(self.a, self.b)]
 
-    def _create_hash_function(self):
-        a, b = random.randint(1, 1000), random.randint(1, 1000)
-        return lambda x: (a * int(x, 16) + b) % 2**32
+    # partial of a module-level function rather than a lambda, so the family can be pickled
+    def _create_hash_function(self, a, b):
+        return partial(_hash, a, b)
 
     def generate_signature(self, hashed_shingles):
         signature = []
@@ -15,3 +30,46 @@ class MinHashing:
             min_hash = min(h(shingle) for shingle in hashed_shingles) # find the min hash value
             signature.append(min_hash)
         return signature
+
+    # flatten many docs' shingle hashes into (values, indptr), doc i owns values[indptr[i]:indptr[i + 1]]
+    @staticmethod
+    def _flatten(documents_hashed_shingles):
+        if isinstance(documents_hashed_shingles, ShingleCorpus): # already flat
+            return documents_hashed_shingles.values().astype(np.uint64), documents_hashed_shingles.indptr
+        arrays = []
+        for hashed_shingles in documents_hashed_shingles:
+            if isinstance(hashed_shingles, np.ndarray):
+                arrays.append(hashed_shingles.astype(np.uint64, copy=False))
+            else: # hex strings from Shingling.hash_shingles
+                arrays.append(np.fromiter((int(x, 16) for x in hashed_shingles), dtype=np.uint64))
+        indptr = np.zeros(len(arrays) + 1, dtype=np.int64)
+        np.cumsum([len(array) for array in arrays], out=indptr[1:])
+        values = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.uint64)
+        return values, indptr
+
+    def _signature_rows(self, values, indptr, out, block_size):
+        # (a * x + b) % 2**32 as broadcast arithmetic, uint64 wrap-around keeps the low 32 bits exact
+        num_docs = len(indptr) - 1
+        start_doc = 0
+        while start_doc < num_docs:
+            # take as many docs as fit in one (block_size, num_hashes) block, at least one
+            stop_doc = int(np.searchsorted(indptr, indptr[start_doc] + block_size, side='right')) - 1
+            stop_doc = min(max(stop_doc, start_doc + 1), num_docs)
+            lo, hi = indptr[start_doc], indptr[stop_doc]
+            block = values[lo:hi, None] * self.a[None, :] + self.b[None, :]
+            block &= np.uint64(self.MAX_HASH)
+
+            lengths = np.diff(indptr[start_doc:stop_doc + 1])
+            non_empty = lengths > 0
+            rows = out[start_doc:stop_doc]
+            rows[~non_empty] = self.MAX_HASH # no shingles, nothing can beat the max value
+            if non_empty.any():
+                rows[non_empty] = np.minimum.reduceat(block, indptr[start_doc:stop_doc][non_empty] - lo, axis=0)
+            start_doc = stop_doc
+
+    def generate_signature_matrix(self, documents_hashed_shingles, block_size=1 << 16):
+        # batch version of generate_signature, returns a (num_docs, num_hashes) uint32 matrix
+        values, indptr = self._flatten(documents_hashed_shingles)
+        signatures = np.empty((len(indptr) - 1, self.num_hashes), dtype=np.uint32)
+        self._signature_rows(values, indptr, signatures, block_size)
+        return signatures
@@ -0,0 +1,61 @@
+import numpy as np
+
+from hashing import mix64
+from minhashing import MinHashing
+
+# one permutation hashing: every shingle is hashed once, the hash range is split into num_hashes bins
+# and each bin keeps its minimum. Bins no shingle fell into are densified by copying the value of another
+# bin, picked by a probe sequence shared by all documents, so signatures stay comparable row by row
+class OnePermutationMinHashing:
+    MAX_HASH = MinHashing.MAX_HASH
+
+    def __init__(self, num_hashes, seed=None):
+        self.num_hashes = num_hashes # num of bins, one signature row each
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy % 2**63)
+        self.salt = np.uint64(self.seed % 2**64)
+
+    _flatten = staticmethod(MinHashing._flatten)
+
+    def generate_signature(self, hashed_shingles):
+        return self.generate_signature_matrix([hashed_shingles])[0].tolist()
+
+    def _densify(self, rows, filled):
+        # optimal densification: empty bin j of a doc takes the value of bin probe(j, t) for the first
+        # attempt t that hits a filled bin of that doc
+        docs, bins = np.nonzero(~filled & filled.any(axis=1)[:, None])
+        attempt = np.uint64(0)
+        while len(docs):
+            attempt += np.uint64(1)
+            probes = (mix64(((bins.astype(np.uint64) << np.uint64(32)) | attempt) ^ self.salt)
+                      % np.uint64(self.num_hashes)).astype(np.int64)
+            hit = filled[docs, probes]
+            rows[docs[hit], bins[hit]] = rows[docs[hit], probes[hit]]
+            docs, bins = docs[~hit], bins[~hit]
+
+    def _signature_rows(self, values, indptr, out, block_size):
+        num_docs = len(indptr) - 1
+        start_doc = 0
+        while start_doc < num_docs:
+            # as many docs as hold about block_size shingles, at least one, like MinHashing
+            stop_doc = int(np.searchsorted(indptr, indptr[start_doc] + block_size, side='right')) - 1
+            stop_doc = min(max(stop_doc, start_doc + 1), num_docs)
+            lo, hi = indptr[start_doc], indptr[stop_doc]
+            hashes = mix64(values[lo:hi] ^ self.salt)
+            # high 32 bits pick the bin, low 32 bits are the value kept in it
+            bins = (((hashes >> np.uint64(32)) * np.uint64(self.num_hashes)) >> np.uint64(32)).astype(np.int64)
+            docs = np.repeat(np.arange(stop_doc - start_doc), np.diff(indptr[start_doc:stop_doc + 1]))
+
+            rows = out[start_doc:stop_doc]
+            rows[:] = self.MAX_HASH
+            np.minimum.at(rows, (docs, bins), (hashes & np.uint64(self.MAX_HASH)).astype(np.uint32))
+            filled = np.zeros(rows.shape, dtype=bool)
+            filled[docs, bins] = True
+            self._densify(rows, filled)
+            start_doc = stop_doc
+
+    # same interface as MinHashing.generate_signature_matrix
+    def generate_signature_matrix(self, documents_hashed_shingles, block_size=1 << 16):
+        values, indptr = self._flatten(documents_hashed_shingles)
+        signatures = np.empty((len(indptr) - 1, self.num_hashes), dtype=np.uint32)
+        self._signature_rows(values, indptr, signatures, block_size)
+        return signatures
@@ -0,0 +1,36 @@
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+_worker = {} # per-process state set by _init_worker
+
+def _init_worker(minhash, shingling, shm_name, shape):
+    _worker['minhash'] = minhash
+    _worker['shingling'] = shingling
+    _worker['shm'] = shared_memory.SharedMemory(name=shm_name) # keep a reference, the buffer dies with it
+    _worker['signatures'] = np.ndarray(shape, dtype=np.uint32, buffer=_worker['shm'].buf)
+
+def _sign_chunk(task):
+    start, chunk = task
+    minhash, shingling = _worker['minhash'], _worker['shingling']
+    if shingling is not None: # raw documents, shingle them in the worker as well
+        chunk = [shingling.hash_document(document) for document in chunk]
+    values, indptr = minhash._flatten(chunk)
+    minhash._signature_rows(values, indptr, _worker['signatures'][start:start + len(chunk)], 1 << 16)
+    return len(chunk)
+
+# MinHashing.generate_signature_matrix sharded over a process pool, every worker writes its rows of one
+# shared output matrix. Pass a Shingling to hand over raw documents instead of shingle hash arrays
+def generate_signature_matrix_parallel(minhash, documents, shingling=None, processes=None, chunk_size=10000):
+    documents = list(documents)
+    shape = (len(documents), minhash.num_hashes)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, shape[0] * shape[1] * 4))
+    try:
+        tasks = ((start, documents[start:start + chunk_size]) for start in range(0, len(documents), chunk_size))
+        with Pool(processes, initializer=_init_worker, initargs=(minhash, shingling, shm.name, shape)) as pool:
+            for _ in pool.imap_unordered(_sign_chunk, tasks):
+                pass
+        return np.ndarray(shape, dtype=np.uint32, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
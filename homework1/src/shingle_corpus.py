@@ -0,0 +1,58 @@
+import numpy as np
+from scipy import sparse
+
+from hashing import mix64
+
+# corpus as a CSR doc x shingle matrix over an interned vocabulary: the shingles of doc i are the term ids
+# indices[indptr[i]:indptr[i + 1]] (int32), vocabulary[term id] is the shingle hash, or the shingle string.
+# indptr is int64 since a large corpus holds more than 2**31 (doc, shingle) entries
+class ShingleCorpus:
+    def __init__(self, indptr, indices, vocabulary):
+        self.indptr = indptr
+        self.indices = indices
+        self.vocabulary = vocabulary
+
+    # hashed corpus from Shingling.hash_document, every doc's array is held until one np.unique builds the
+    # vocabulary (the sorted unique hashes)
+    @staticmethod
+    def from_documents(documents, shingling, bits=32):
+        return ShingleCorpus.from_hashed_shingles(shingling.hash_document(document, bits) for document in documents)
+
+    @staticmethod
+    def from_hashed_shingles(documents_hashed_shingles):
+        arrays = [np.asarray(hashed_shingles) for hashed_shingles in documents_hashed_shingles]
+        indptr = np.zeros(len(arrays) + 1, dtype=np.int64)
+        np.cumsum([len(array) for array in arrays], out=indptr[1:])
+        values = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.uint32)
+        vocabulary, indices = np.unique(values, return_inverse=True)
+        return ShingleCorpus(indptr, indices.ravel().astype(np.int32), vocabulary)
+
+    # string shingles (e.g. Shingling.generate_shingles), numbered in order of first appearance
+    @staticmethod
+    def from_shingle_sets(shingle_sets):
+        vocabulary = {}
+        indptr = [0]
+        indices = []
+        for shingles in shingle_sets:
+            indices.extend(vocabulary.setdefault(shingle, len(vocabulary)) for shingle in set(shingles))
+            indptr.append(len(indices))
+        return ShingleCorpus(np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=np.int32), list(vocabulary))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + getattr(self.vocabulary, 'nbytes', 0)
+
+    # integer value of every entry, what MinHashing hashes: the shingle hash, or the scrambled term id for string
+    # shingles. Raw term ids are small integers, (a * x + b) % 2**32 never wraps on them and would keep the same
+    # minimum term id under every hash function
+    def values(self):
+        if isinstance(self.vocabulary, np.ndarray):
+            return self.vocabulary[self.indices]
+        return mix64(self.indices)
+
+    def to_csr(self):
+        data = np.ones(len(self.indices), dtype=np.int32)
+        return sparse.csr_matrix((data, self.indices, self.indptr), shape=(len(self), len(self.vocabulary)))
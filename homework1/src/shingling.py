@@ -1,6 +1,12 @@
 import hashlib
 
+import numpy as np
+
+from hashing import mix64
+
 class Shingling:
+    BASE = np.uint64(0x100000001b3) # multiplier of the rolling hash
+
     def __init__(self, k):
         self.k = k # length
 
@@ -12,3 +18,23 @@ class Shingling:
 
     def hash_shingles(self, shingles):
         return {hashlib.sha1(shingle.encode()).hexdigest()[:8] for shingle in shingles}
+
+    # hash every k-char window of the document straight into a sorted, unique integer array
+    def hash_document(self, document, bits=32):
+        if bits not in (32, 64):
+            raise ValueError("bits must be 32 or 64")
+        chars = np.frombuffer(document.encode('utf-32-le'), dtype='<u4').astype(np.uint64)
+        n = len(chars) - self.k + 1
+        if n <= 0:
+            return np.empty(0, dtype=np.uint32 if bits == 32 else np.uint64)
+
+        # Rabin-Karp polynomial hash of all windows at once: h = c0 * B^(k-1) + ... + c(k-1) mod 2**64
+        hashes = chars[:n].copy()
+        for j in range(1, self.k):
+            hashes *= self.BASE
+            hashes += chars[j:j + n]
+        hashes = mix64(hashes)
+
+        if bits == 32:
+            hashes = (hashes >> np.uint64(32)).astype(np.uint32)
+        return np.unique(hashes)
@@ -0,0 +1,123 @@
+import json
+import os
+
+import numpy as np
+
+# append-only on-disk store of a signature matrix, its doc ids and optionally each doc's shingle hashes.
+# Matrices are raw files opened with np.memmap, meta.json records how many rows are complete and is
+# replaced last on every append, so a crashed append is cut off again by the next one. meta.json also records
+# the hash family (class and seed) the signatures come from, and appends signed by another family are refused
+class SignatureStore:
+    def __init__(self, path, num_hashes=None, dtype=np.uint32, with_shingles=False, minhash=None):
+        self.path = path
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+            if minhash is not None:
+                self.check_family(minhash)
+        else:
+            if num_hashes is None:
+                raise ValueError(f"{path} holds no store, num_hashes is needed to create one")
+            os.makedirs(path, exist_ok=True)
+            self.meta = {'num_hashes': num_hashes, 'dtype': np.dtype(dtype).str, 'with_shingles': with_shingles,
+                         'num_docs': 0, 'num_shingles': 0, 'doc_ids_bytes': 0,
+                         'family': self._family(minhash) if minhash is not None else None}
+            self._write_meta()
+        self._doc_ids = None
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _write_meta(self):
+        with open(self._file('meta.json.tmp'), 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(self._file('meta.json.tmp'), self._file('meta.json'))
+
+    # append raw bytes after the last complete record, dropping leftovers of a crashed append
+    @staticmethod
+    def _append(path, valid_bytes, data):
+        with open(path, 'ab') as f:
+            f.truncate(valid_bytes)
+            f.write(data if isinstance(data, bytes) else np.ascontiguousarray(data).tobytes())
+
+    def __len__(self):
+        return self.meta['num_docs']
+
+    @staticmethod
+    def _family(minhash):
+        return {'class': type(minhash).__name__, 'seed': int(minhash.seed)}
+
+    # raise unless minhash signs like the signatures already stored, an empty store adopts its family
+    def check_family(self, minhash):
+        family = self._family(minhash)
+        if self.meta.get('family') is None:
+            if len(self):
+                raise ValueError(f"{self.path} holds signatures of an unrecorded hash family")
+            self.meta['family'] = family
+            self._write_meta()
+        elif self.meta['family'] != family:
+            raise ValueError(f"{self.path} holds {self.meta['family']} signatures, not {family}")
+
+    @property
+    def num_hashes(self):
+        return self.meta['num_hashes']
+
+    @property
+    def dtype(self):
+        return np.dtype(self.meta['dtype'])
+
+    # minhash, the family the batch was signed with, is checked against the store's when given
+    def append(self, doc_ids, signature_matrix, hashed_shingles=None, minhash=None):
+        if minhash is not None:
+            self.check_family(minhash)
+        doc_ids = list(doc_ids)
+        signature_matrix = np.asarray(signature_matrix, dtype=self.dtype)
+        if signature_matrix.shape != (len(doc_ids), self.num_hashes):
+            raise ValueError(f"expected a ({len(doc_ids)}, {self.num_hashes}) signature matrix, got {signature_matrix.shape}")
+        num_docs, num_shingles = self.meta['num_docs'], self.meta['num_shingles']
+
+        self._append(self._file('signatures.bin'), num_docs * self.num_hashes * self.dtype.itemsize, signature_matrix)
+        # one json value per line, so int and str ids both survive the round trip
+        lines = ''.join(json.dumps(doc_id) + '\n' for doc_id in doc_ids).encode()
+        self._append(self._file('doc_ids.jsonl'), self.meta['doc_ids_bytes'], lines)
+        if self.meta['with_shingles']:
+            if hashed_shingles is None or len(hashed_shingles) != len(doc_ids):
+                raise ValueError("this store keeps shingle hashes, pass one array per doc")
+            lengths = np.array([len(shingles) for shingles in hashed_shingles], dtype=np.int64)
+            values = np.concatenate([np.asarray(shingles, dtype=np.uint64) for shingles in hashed_shingles] + [np.empty(0, dtype=np.uint64)])
+            self._append(self._file('shingles.bin'), num_shingles * 8, values)
+            self._append(self._file('shingle_ends.bin'), num_docs * 8, num_shingles + np.cumsum(lengths))
+            self.meta['num_shingles'] = num_shingles + int(lengths.sum())
+
+        self.meta['doc_ids_bytes'] += len(lines)
+        self.meta['num_docs'] = num_docs + len(doc_ids)
+        self._write_meta()
+        self._doc_ids = None
+
+    def _memmap(self, name, dtype, shape):
+        if shape[0] == 0: # np.memmap can not map an empty file
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode='r', shape=shape)
+
+    # (num_docs, num_hashes) read-only memory-mapped signature matrix
+    @property
+    def signatures(self):
+        return self._memmap('signatures.bin', self.dtype, (len(self), self.num_hashes))
+
+    @property
+    def doc_ids(self):
+        if self._doc_ids is None and len(self) == 0:
+            self._doc_ids = []
+        elif self._doc_ids is None:
+            with open(self._file('doc_ids.jsonl')) as f:
+                self._doc_ids = [json.loads(line) for _, line in zip(range(len(self)), f)]
+        return self._doc_ids
+
+    # shingle hashes of the doc in row i
+    def shingles(self, i):
+        if not self.meta['with_shingles']:
+            raise ValueError("this store was created without shingle hashes")
+        ends = self._memmap('shingle_ends.bin', np.int64, (len(self),))
+        start = ends[i - 1] if i > 0 else 0
+        return np.asarray(self._memmap('shingles.bin', np.uint64, (self.meta['num_shingles'],))[start:ends[i]])
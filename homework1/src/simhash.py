@@ -0,0 +1,91 @@
+import numpy as np
+
+from compare_signatures import CompareSignatures
+from hashing import mix64
+
+# simhash / random hyperplane fingerprints: every feature hash is expanded into num_bits pseudo random
+# +-1 votes, weighted, summed per document, and the sign of each sum gives one fingerprint bit
+class SimHashing:
+    def __init__(self, num_bits=64, seed=None):
+        if num_bits % 64:
+            raise ValueError("num_bits must be a multiple of 64")
+        self.num_bits = num_bits
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy % 2**63)
+        self.salts = np.random.default_rng(self.seed).integers(0, 2**63, size=num_bits // 64).astype(np.uint64)
+
+    # features: an array of feature hashes (e.g. Shingling.hash_document) or a dict <feature hash, weight>
+    @staticmethod
+    def _features(features):
+        if isinstance(features, dict):
+            return (np.fromiter(features.keys(), dtype=np.uint64, count=len(features)),
+                    np.fromiter(features.values(), dtype=np.float64, count=len(features)))
+        features = np.asarray(features, dtype=np.uint64)
+        return features, np.ones(len(features), dtype=np.float64)
+
+    # +-1 vote of every feature for every fingerprint bit, (num_features, num_bits) int8
+    def _votes(self, hashes):
+        words = mix64(hashes[:, None] ^ self.salts[None, :])
+        bits = np.unpackbits(words.view(np.uint8).reshape(len(hashes), -1), axis=1, bitorder='little')
+        return bits.astype(np.int8) * 2 - 1
+
+    def _pack(self, scores):
+        return np.packbits(scores > 0, axis=-1, bitorder='little').view(np.uint64)
+
+    def generate_fingerprint(self, features):
+        hashes, weights = self._features(features)
+        return self._pack(weights @ self._votes(hashes))
+
+    # docs are parsed block_size at a time, and their features voted max_features at a time, so a block of
+    # long documents never holds more than a (max_features, num_bits) vote matrix
+    def generate_fingerprint_matrix(self, documents_features, block_size=256, max_features=1 << 14):
+        documents_features = list(documents_features)
+        fingerprints = np.zeros((len(documents_features), self.num_bits // 64), dtype=np.uint64)
+        for start in range(0, len(documents_features), block_size):
+            parsed = [self._features(features) for features in documents_features[start:start + block_size]]
+            lengths = np.array([len(hashes) for hashes, _ in parsed])
+            if not lengths.any():
+                continue
+            hashes = np.concatenate([hashes for hashes, _ in parsed])
+            weights = np.concatenate([weights for _, weights in parsed])
+            docs = np.repeat(np.arange(len(parsed)), lengths) # features of a doc are contiguous
+            scores = np.zeros((len(parsed), self.num_bits))
+            for chunk in range(0, len(hashes), max_features):
+                chunk_docs = docs[chunk:chunk + max_features]
+                votes = self._votes(hashes[chunk:chunk + max_features]) * weights[chunk:chunk + max_features, None]
+                present, firsts = np.unique(chunk_docs, return_index=True)
+                scores[present] += np.add.reduceat(votes, firsts, axis=0)
+            fingerprints[start:start + len(parsed)] = self._pack(scores)
+        return SimHashFingerprints(fingerprints, self.num_bits)
+
+# (num_docs, num_bits // 64) uint64 fingerprints, compared by hamming distance: similarity = 1 - d / num_bits
+class SimHashFingerprints:
+    def __init__(self, words, num_bits):
+        self.words = words
+        self.num_bits = num_bits
+
+    @property
+    def shape(self):
+        return self.words.shape
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getitem__(self, key):
+        return self.words[key]
+
+    def distance(self, i, j):
+        return int(CompareSignatures.hamming_distance(self.words[i], self.words[j]))
+
+    def pairwise_similarity(self, pairs, batch_size=1 << 16):
+        return self.cross_similarity(pairs[:, 0], self, pairs[:, 1], batch_size)
+
+    # rows of these fingerprints against rows of other fingerprints of the same width
+    def cross_similarity(self, rows, other, other_rows, batch_size=1 << 16):
+        if other.num_bits != self.num_bits:
+            raise ValueError("both fingerprint sets must have the same number of bits")
+        similarities = np.empty(len(rows), dtype=np.float64)
+        for start in range(0, len(rows), batch_size):
+            distances = CompareSignatures.hamming_distance(
+                self.words[rows[start:start + batch_size]], other.words[other_rows[start:start + batch_size]])
+            similarities[start:start + batch_size] = 1 - distances / self.num_bits
+        return similarities
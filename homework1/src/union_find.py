@@ -0,0 +1,48 @@
+import numpy as np
+
+# disjoint sets over 0..n-1 in one parent array. Roots are always the smallest member, so batches of
+# unions can be applied with array operations: hook every larger root onto the smaller one and repeat
+class UnionFind:
+    def __init__(self, n):
+        self.parent = np.arange(n, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.parent)
+
+    # roots of all x, compressing the paths of x on the way
+    def roots(self, x):
+        x = np.asarray(x, dtype=np.int64)
+        roots = self.parent[x]
+        while True:
+            grandparents = self.parent[roots]
+            if (grandparents == roots).all():
+                break
+            roots = grandparents
+        self.parent[x] = roots
+        return roots
+
+    def find(self, x):
+        return int(self.roots(np.array([x]))[0])
+
+    def union_pairs(self, i, j):
+        i, j = np.asarray(i, dtype=np.int64), np.asarray(j, dtype=np.int64)
+        while len(i):
+            root_i, root_j = self.roots(i), self.roots(j)
+            differ = root_i != root_j
+            i, j, root_i, root_j = i[differ], j[differ], root_i[differ], root_j[differ]
+            # several pairs may hook the same root, np.minimum.at keeps the smallest and the loop redoes the rest
+            np.minimum.at(self.parent, np.maximum(root_i, root_j), np.minimum(root_i, root_j))
+
+    def union(self, x, y):
+        self.union_pairs([x], [y])
+
+    # merge a stream of (i, j) array batches, e.g. LSH.band_candidate_pairs after verification
+    def consume(self, pair_batches):
+        for i, j in pair_batches:
+            self.union_pairs(i, j)
+        return self
+
+    # dense cluster id per element, numbered by smallest member
+    def labels(self):
+        _, labels = np.unique(self.roots(np.arange(len(self.parent))), return_inverse=True)
+        return labels.ravel()
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from b_bit_signatures import BBitSignatures
+from minhashing import MinHashing
+
+
+# unrelated docs (disjoint random shingles) must score near 0 at every b, whatever the parity of `a`
+def test_unrelated_documents_score_near_zero():
+    rng = np.random.default_rng(0)
+    docs = [np.arange(i * 1000, i * 1000 + 200, dtype=np.uint32) + rng.integers(0, 800) for i in range(300)]
+    signature_matrix = MinHashing(200, seed=1).generate_signature_matrix(docs)
+    i, j = np.triu_indices(len(docs), k=1)
+    pairs = np.column_stack((i, j))
+    for b in (1, 2, 4):
+        similarities = BBitSignatures.from_signatures(signature_matrix, b).pairwise_similarity(pairs)
+        assert similarities.mean() < 0.1
+        assert (similarities >= 0.5).mean() < 0.01
+
+
+def test_identical_documents_score_one():
+    docs = [np.arange(100, dtype=np.uint32)] * 2
+    signature_matrix = MinHashing(128, seed=1).generate_signature_matrix(docs)
+    assert BBitSignatures.from_signatures(signature_matrix, 1).similarity(0, 1) == 1.0
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from compare_sets import CompareSets
+from minhashing import MinHashing
+from shingle_corpus import ShingleCorpus
+
+
+# string shingles are interned into small term ids, signatures over them must still estimate jaccard
+def test_signatures_of_shingle_sets_estimate_jaccard():
+    rng = np.random.default_rng(0)
+    vocabulary = [f'shingle{k}' for k in range(400)]
+    shingle_sets = [set(rng.choice(vocabulary, rng.integers(20, 80), replace=False)) for _ in range(100)]
+    signature_matrix = MinHashing(200, seed=1).generate_signature_matrix(ShingleCorpus.from_shingle_sets(shingle_sets))
+    errors = []
+    for i in range(len(shingle_sets)):
+        for j in range(i + 1, len(shingle_sets)):
+            estimate = (signature_matrix[i] == signature_matrix[j]).mean()
+            errors.append(abs(estimate - CompareSets.jaccard_similarity(shingle_sets[i], shingle_sets[j])))
+    assert np.mean(errors) < 0.08
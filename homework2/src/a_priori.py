@@ -1,8 +1,13 @@
-from collections import defaultdict, Counter
-from typing import Dict, List, Set, KeysView, FrozenSet
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, FrozenSet, Iterable, Tuple, Union
 from itertools import combinations
 import numpy as np
 
+from basket_store import BasketStore
+from pair_counting import PCYFilter, pick_frequent_pairs
+
+Baskets = Union[List[Set[int]], BasketStore]
+
 
 def read_dataset(file: str) -> List[Set[int]]:
     """
@@ -21,19 +26,30 @@ def read_dataset(file: str) -> List[Set[int]]:
     return baskets
 
 
-def find_frequent_singletons(baskets: List[Set[int]], s: int = 1,) -> Dict[FrozenSet[int], int]:
+def find_frequent_singletons(baskets: Baskets, s: int = 1, pcy: Optional[PCYFilter] = None) -> Dict[FrozenSet[int], int]:
     """
     Find all the singletons having a support greater than s.
-    baskets: the list of all baskets
+    baskets: the list of all baskets, or a BasketStore
     s: the threshold
+    pcy: an optional PCYFilter, every pair of every basket is hashed into its buckets in the same pass
     Return the set of all frequent singletons
     """
 
     item_to_support = defaultdict(int)
 
-    for basket in baskets:
-        for item in basket:
-            item_to_support[frozenset([item])] += 1
+    if pcy is not None:
+        if not isinstance(baskets, BasketStore):
+            baskets = BasketStore.from_baskets(baskets)
+        pcy.observe(baskets, s)
+
+    if isinstance(baskets, BasketStore): # one bincount over the item array
+        support = baskets.item_support()
+        for item in np.flatnonzero(support).tolist():
+            item_to_support[frozenset([item])] = int(support[item])
+    else:
+        for basket in baskets:
+            for item in basket:
+                item_to_support[frozenset([item])] += 1
 
     print(f'Different items: {len(item_to_support)}')
     print(f'Average support: {np.mean(list(item_to_support.values())):.2f}')
@@ -45,82 +61,164 @@ def find_frequent_singletons(baskets: List[Set[int]], s: int = 1,) -> Dict[Froze
                )
 
 
-def generate_candidate_item_sets(precedent_item_sets: KeysView[FrozenSet[int]],item_set_length: int) -> Set[FrozenSet[int]]:
+def generate_candidate_item_sets(precedent_item_sets: Iterable[Iterable[int]],item_set_length: int) -> Set[Tuple[int, ...]]:
     """
     Step k+1: Find the set of candidate (new frequent itemsets), by combining the itemsets found at step k.
+    Two itemsets are only joined when they share their first k-1 items, and a candidate is dropped
+    as soon as one of its subsets of length k is not frequent.
     precedent_item_sets: the frequent itemsets found at time k
     item_set_length: the length of the next candidates to be returned
-    Return a set of candidate frequent itemsets of length k+1
+    Return a set of candidate frequent itemsets of length k+1, as sorted tuples
     """
-    return {
-        item_set_left | item_set_right
-        for item_set_left, item_set_right in combinations(precedent_item_sets, 2)
-        if len(item_set_left | item_set_right) == item_set_length
-    }
+    frequent_item_sets = sorted(tuple(sorted(item_set)) for item_set in precedent_item_sets)
+    frequent_lookup = set(frequent_item_sets)
+
+    prefix_to_last_items: Dict[Tuple[int, ...], List[int]] = defaultdict(list)
+    for item_set in frequent_item_sets:
+        if len(item_set) == item_set_length - 1:
+            prefix_to_last_items[item_set[:-1]].append(item_set[-1])  # sorted, since the itemsets are
+
+    candidate_item_sets: Set[Tuple[int, ...]] = set()
+    for prefix, last_items in prefix_to_last_items.items():
+        for left, right in combinations(last_items, 2):
+            candidate = prefix + (left, right)
+            # the subsets dropping `left` or `right` are the two joined itemsets, check the others
+            if all(candidate[:i] + candidate[i + 1:] in frequent_lookup for i in range(item_set_length - 2)):
+                candidate_item_sets.add(candidate)
+
+    return candidate_item_sets
+
+
+def build_candidate_trie(candidate_item_sets: Iterable[Tuple[int, ...]]) -> Tuple[dict, List[Tuple[int, ...]]]:
+    """
+    Build a prefix trie of the candidates: nested dicts item -> child, where the last level maps
+    the last item of a candidate to the candidate's position in the returned list.
+    candidate_item_sets: the candidates, as sorted tuples of the same length
+    Return the trie and the list of candidates it indexes
+    """
+    candidates = list(candidate_item_sets)
+    trie: dict = {}
+    for index, candidate in enumerate(candidates):
+        node = trie
+        for item in candidate[:-1]:
+            node = node.setdefault(item, {})
+        node[candidate[-1]] = index
+    return trie, candidates
+
+
+def _count_basket(node: dict, basket: List[int], start: int, remaining: int, counts: List[int]) -> None:
+    """
+    Walk the trie along the sorted basket, only following items that continue a candidate prefix.
+    remaining: the number of items still to pick, including the one picked at this node
+    """
+    end = len(basket) - remaining + 1  # leave room for the items still to pick
+    if remaining == 1:
+        for item in basket[start:end]:
+            index = node.get(item)
+            if index is not None:
+                counts[index] += 1
+        return
+    for position in range(start, end):
+        child = node.get(basket[position])
+        if child is not None:
+            _count_basket(child, basket, position + 1, remaining - 1, counts)
+
+
+def count_support(baskets: Baskets, candidate_item_sets: Set[Tuple[int, ...]], item_set_length: int) -> Dict[Tuple[int, ...], int]:
+    """
+    Count the support of every candidate by walking each basket against the candidate trie,
+    so the work follows the candidates instead of all the combinations of the basket.
+    candidate_item_sets: the candidates, as sorted tuples
+    item_set_length: the length of the candidates
+    Return the support of every candidate
+    """
+    trie, candidates = build_candidate_trie(candidate_item_sets)
+    candidate_items = {item for candidate in candidates for item in candidate}
+    counts = [0] * len(candidates)
+
+    for basket in baskets:
+        basket = sorted(item for item in basket if item in candidate_items)  # items in no candidate never match
+        if len(basket) >= item_set_length:
+            _count_basket(trie, basket, 0, item_set_length, counts)
+
+    return dict(zip(candidates, counts))
 
 
-def pick_frequent_item_sets(baskets: List[Set[int]],candidate_item_sets: Set[FrozenSet[int]],item_set_length: int,s: int = 1) -> Dict[FrozenSet[int], int]:
+def pick_frequent_item_sets(baskets: Baskets,candidate_item_sets: Set[Tuple[int, ...]],item_set_length: int,s: int = 1) -> Dict[FrozenSet[int], int]:
     """
     Find all the itemsets with a support greater than s.
-    candidate_item_sets: the set of itemsets candidate
+    candidate_item_sets: the set of itemsets candidate, as sorted tuples
     item_set_length: the length of the itemsets
     s: the threshold
     Return the set of all frequent itemsets
     """
-    item_set_to_support = Counter([
-            frozenset(item_set)
-            for basket in baskets
-            for item_set in combinations(basket, item_set_length)
-            if frozenset(item_set) in candidate_item_sets
-    ])  # 统计候选项集中每个项集的支持度（出现次数）
+    item_set_to_support = count_support(baskets, candidate_item_sets, item_set_length)  # 统计候选项集中每个项集的支持度（出现次数）
 
-    return dict(
-        filter(
-            lambda element: element[1] > s,
-            item_set_to_support.items()
-        )
-    )  # 从支持度字典中挑选出支持度大于阈值的项集
+    return {
+        frozenset(item_set): support
+        for item_set, support in item_set_to_support.items()
+        if support > s
+    }  # 从支持度字典中挑选出支持度大于阈值的项集
 
 
-def find_frequent_item_sets(file: str,s: int = 1,) -> Dict[FrozenSet[int], int]:
+def find_frequent_item_sets(file: str,s: int = 1, pcy_buckets: int = 0, pcy_hashes: int = 1,
+                            pcy_stages: int = 1) -> Dict[FrozenSet[int], int]:
     """
     Generates the set of frequent itemsets with (support >= s) and (maximum size = maximum_item_set_size).
     s: the minimum support required to consider an itemset frequent
+    pcy_buckets: buckets of the PCY hash tables filtering the candidate pairs, 0 counts every pair of frequent singletons
+    pcy_hashes: hash tables filled during the singleton pass (multihash)
+    pcy_stages: passes over the baskets that build PCY bitmaps before counting pairs (multistage)
     Return the set of all frequent itemsets, represented as frozensets, mapped to their support
     """
 
-    baskets = read_dataset(file=file)
+    baskets = BasketStore.from_file(file=file)
+    pcy = PCYFilter(num_buckets=pcy_buckets, num_hashes=pcy_hashes) if pcy_buckets > 0 else None
 
     # The first frequent itemsets are the frequent singletons
-    frequent_item_sets: Dict[FrozenSet[int], int] = find_frequent_singletons(baskets=baskets, s=s,)
+    frequent_item_sets: Dict[FrozenSet[int], int] = find_frequent_singletons(baskets=baskets, s=s, pcy=pcy)
     print(f'Number of singletons: {len(frequent_item_sets)}')
 
+    if pcy is not None:
+        for _ in range(pcy_stages - 1):
+            pcy.add_stage(baskets, [item for item_set in frequent_item_sets for item in item_set], s)
+
     precedent_frequent_item_sets = frequent_item_sets.keys()
     item_set_length = 2
     while len(precedent_frequent_item_sets) > 1:
         print("------------------------------------")
         print("Computing frequent itemsets of length {}...".format(item_set_length))
 
-        candidate_item_sets = generate_candidate_item_sets( # Generate candidate item sets
-            precedent_item_sets=precedent_frequent_item_sets,
-            item_set_length=item_set_length
-        )
+        if item_set_length == 2: # every pair of frequent singletons is a candidate, count them in one array pass
+            new_frequent_item_sets = pick_frequent_pairs(
+                baskets=baskets,
+                frequent_items=[item for item_set in precedent_frequent_item_sets for item in item_set],
+                s=s,
+                pcy=pcy
+            )
+        else:
+            candidate_item_sets = generate_candidate_item_sets( # Generate candidate item sets
+                precedent_item_sets=precedent_frequent_item_sets,
+                item_set_length=item_set_length
+            )
+
+            print("{} candidates generated.".format(len(candidate_item_sets)))
 
-        print("{} candidates generated.".format(len(candidate_item_sets)))
+            if len(candidate_item_sets) == 0: # pruning can leave no candidate even with several frequent itemsets left
+                break
 
-        if len(candidate_item_sets) > 0: # find whose support >= s
-            new_frequent_item_sets = pick_frequent_item_sets(
+            new_frequent_item_sets = pick_frequent_item_sets( # find whose support >= s
                 baskets=baskets,
                 candidate_item_sets=candidate_item_sets,
                 item_set_length=item_set_length,
                 s=s
             )
 
-            frequent_item_sets.update(new_frequent_item_sets)
-            precedent_frequent_item_sets = new_frequent_item_sets.keys()
-            item_set_length += 1
+        frequent_item_sets.update(new_frequent_item_sets)
+        precedent_frequent_item_sets = new_frequent_item_sets.keys()
+        item_set_length += 1
 
-            print(f'Finish. {len(new_frequent_item_sets)} frequent items was/were found.')
+        print(f'Finish. {len(new_frequent_item_sets)} frequent items was/were found.')
 
     print(f'\nTotally {len(frequent_item_sets)} frequent items were found.')
     print()
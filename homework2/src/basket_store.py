@@ -0,0 +1,88 @@
+from typing import Iterable, Iterator, List, Tuple
+import numpy as np
+
+
+class BasketStore:
+    """
+    Baskets held as CSR arrays: the items of basket i are items[offsets[i]:offsets[i + 1]],
+    sorted and without duplicates, so no Python object is kept per basket or per item.
+    """
+
+    def __init__(self, offsets: np.ndarray, items: np.ndarray):
+        """
+        :param offsets: int64 array of length (number of baskets + 1), offsets[0] == 0
+        :param items: int32 array of all item ids, basket after basket
+        """
+        self.offsets: np.ndarray = offsets
+        self.items: np.ndarray = items
+
+    @staticmethod
+    def _parse_chunk(lines: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Parse a chunk of .dat lines into (basket lengths, items), sorting and deduplicating every basket.
+        """
+        tokens = [line.split() for line in lines]
+        lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+        items = np.array([item for basket in tokens for item in basket], dtype=np.int32)
+
+        basket_ids = np.repeat(np.arange(len(lines)), lengths)
+        order = np.lexsort((items, basket_ids))
+        items, basket_ids = items[order], basket_ids[order]
+        keep = np.ones(len(items), dtype=bool)
+        keep[1:] = (items[1:] != items[:-1]) | (basket_ids[1:] != basket_ids[:-1])
+        return np.bincount(basket_ids[keep], minlength=len(lines)), items[keep]
+
+    @staticmethod
+    def from_baskets(baskets: Iterable[Iterable[int]]) -> "BasketStore":
+        """
+        Build a store from baskets already in memory, e.g. the output of read_dataset.
+        """
+        baskets = [sorted(set(basket)) for basket in baskets]
+        offsets = np.zeros(len(baskets) + 1, dtype=np.int64)
+        np.cumsum([len(basket) for basket in baskets], out=offsets[1:])
+        return BasketStore(offsets, np.array([item for basket in baskets for item in basket], dtype=np.int32))
+
+    @staticmethod
+    def from_file(file: str, chunk_size: int = 1 << 22) -> "BasketStore":
+        """
+        Read a .dat file, every row is a basket of items, parsing about chunk_size bytes of lines at a time.
+        """
+        lengths: List[np.ndarray] = []
+        items: List[np.ndarray] = []
+        with open(file, "r") as f:
+            while True:
+                lines = f.readlines(chunk_size)
+                if not lines:
+                    break
+                chunk_lengths, chunk_items = BasketStore._parse_chunk(lines)
+                lengths.append(chunk_lengths)
+                items.append(chunk_items)
+
+        offsets = np.zeros(sum(map(len, lengths)) + 1, dtype=np.int64)
+        if lengths:
+            np.cumsum(np.concatenate(lengths), out=offsets[1:])
+        return BasketStore(offsets, np.concatenate(items) if items else np.empty(0, dtype=np.int32))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __iter__(self) -> Iterator[List[int]]:
+        """
+        Yield every basket as a sorted list of item ids, converting block_size baskets at a time.
+        """
+        block_size = 1 << 16
+        for block_start in range(0, len(self), block_size):
+            offsets = self.offsets[block_start:block_start + block_size + 1]
+            items = self.items[offsets[0]:offsets[-1]].tolist()
+            bounds = (offsets - offsets[0]).tolist()
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                yield items[start:end]
+
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def item_support(self) -> np.ndarray:
+        """
+        Support of every item id, indexed by item id.
+        """
+        return np.bincount(self.items) if len(self.items) else np.zeros(0, dtype=np.int64)
@@ -0,0 +1,213 @@
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+from basket_store import BasketStore
+
+
+def dense_item_ids(store: BasketStore, items: Iterable[int]) -> np.ndarray:
+    """
+    Map item ids to dense ids 0..m-1 in increasing item order.
+    Return a lookup array indexed by item id, -1 for items that are not in `items`
+    """
+    items = np.unique(np.fromiter(items, dtype=np.int64))
+    size = max(int(store.items.max()) + 1 if len(store.items) else 0, int(items.max()) + 1 if len(items) else 0)
+    item_to_id = np.full(size, -1, dtype=np.int64)
+    item_to_id[items] = np.arange(len(items))
+    return item_to_id
+
+
+def basket_pairs(store: BasketStore, item_to_id: np.ndarray, block_size: int = 1 << 14) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Yield, block of baskets by block, the dense ids (i, j), i < j, of every pair of mapped items sharing a basket.
+    Baskets of the same length are expanded together with one triu_indices gather.
+    """
+    for block_start in range(0, len(store), block_size):
+        offsets = store.offsets[block_start:block_start + block_size + 1]
+        ids = item_to_id[store.items[offsets[0]:offsets[-1]]]
+        basket_index = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        mapped = ids >= 0
+        ids, basket_index = ids[mapped], basket_index[mapped]  # sorted items map to sorted ids
+
+        lengths = np.bincount(basket_index, minlength=len(offsets) - 1)
+        starts = np.r_[0, np.cumsum(lengths)[:-1]]
+        for length in np.unique(lengths[lengths > 1]):
+            rows = ids[starts[lengths == length][:, None] + np.arange(length)]
+            left, right = np.triu_indices(length, k=1)
+            yield rows[:, left].ravel(), rows[:, right].ravel()
+
+
+def triangular_index(i: np.ndarray, j: np.ndarray, m: int) -> np.ndarray:
+    """
+    Position of pair (i, j), i < j < m, in the flat upper triangle stored row by row.
+    """
+    return i * (2 * m - i - 1) // 2 + (j - i - 1)
+
+
+def count_pairs_triangular(store: BasketStore, item_to_id: np.ndarray, m: int, pcy: Optional["PCYFilter"] = None) -> np.ndarray:
+    """
+    Count every pair of the m mapped items in a flat triangular array of m * (m - 1) / 2 uint32 counters.
+    """
+    counts = np.zeros(m * (m - 1) // 2, dtype=np.uint32)
+    for i, j in basket_pairs(store, item_to_id) if pcy is None else pcy.candidate_pairs(store, item_to_id):
+        positions, block_counts = np.unique(triangular_index(i, j, m), return_counts=True)
+        counts[positions] += block_counts.astype(np.uint32)  # positions are unique, no full-length temporary
+    return counts
+
+
+def count_pairs_sparse(store: BasketStore, item_to_id: np.ndarray, m: int, pcy: Optional["PCYFilter"] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Count only the pairs that occur, as a table of sorted pair codes i * m + j and their counts,
+    for when the triangular array would not fit in memory, or only the pairs a PCY filter admits.
+    """
+    codes = np.empty(0, dtype=np.int64)
+    counts = np.empty(0, dtype=np.int64)
+    for i, j in basket_pairs(store, item_to_id) if pcy is None else pcy.candidate_pairs(store, item_to_id):
+        block_codes, block_counts = np.unique(i * m + j, return_counts=True)
+        merged_codes = np.concatenate((codes, block_codes))
+        merged_counts = np.concatenate((counts, block_counts))
+        codes, inverse = np.unique(merged_codes, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=merged_counts, minlength=len(codes)).astype(np.int64)
+    return codes, counts
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """
+    murmur3 fmix64 finalizer, spreads every input bit over the whole 64-bit word.
+    """
+    x = x.astype(np.uint64)
+    x ^= x >> np.uint64(33)
+    x *= np.uint64(0xff51afd7ed558ccd)
+    x ^= x >> np.uint64(33)
+    x *= np.uint64(0xc4ceb9fe1a85ec53)
+    x ^= x >> np.uint64(33)
+    return x
+
+
+class PCYFilter:
+    """
+    PCY hash filter for candidate pairs: pairs are hashed into bucket-count arrays, buckets with a
+    count greater than s become bits of a bitmap, and a pair is only admitted as a candidate when its
+    bucket is frequent in every bitmap.
+    The first pass (observe, run during the singleton pass) counts all pairs with num_hashes hash
+    functions at once (multihash). Every add_stage is one more pass (multistage) that only counts the
+    pairs of frequent items still admitted, with a fresh hash function.
+    """
+
+    def __init__(self, num_buckets: int = 1 << 20, num_hashes: int = 1, seed: int = 0):
+        """
+        :param num_buckets: number of buckets of every hash table
+        :param num_hashes: number of hash functions of the first pass
+        :param seed: seed of the hash functions
+        """
+        self.num_buckets: int = num_buckets
+        self.num_hashes: int = num_hashes
+        self.rng = np.random.default_rng(seed)
+        self.salts: List[np.uint64] = []
+        self.bitmaps: List[np.ndarray] = []  # packed, little bit order
+
+    def _new_salt(self) -> np.uint64:
+        self.salts.append(np.uint64(self.rng.integers(0, 2**63)))
+        return self.salts[-1]
+
+    def _buckets(self, salt: np.uint64, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        codes = (i.astype(np.uint64) << np.uint64(32)) | j.astype(np.uint64)
+        return (_mix(codes ^ salt) % np.uint64(self.num_buckets)).astype(np.int64)
+
+    def _count(self, salts: List[np.uint64], pairs: Iterator[Tuple[np.ndarray, np.ndarray]], s: int) -> None:
+        counts = [np.zeros(self.num_buckets, dtype=np.uint32) for _ in salts]
+        for i, j in pairs:
+            for salt, table in zip(salts, counts):
+                buckets, bucket_counts = np.unique(self._buckets(salt, i, j), return_counts=True)
+                table[buckets] += bucket_counts.astype(np.uint32)
+        self.bitmaps.extend(np.packbits(table > s, bitorder='little') for table in counts)
+
+    def observe(self, baskets: BasketStore, s: int) -> None:
+        """
+        First pass: hash every pair of every basket, on item ids.
+        """
+        item_to_id = np.arange(int(baskets.items.max()) + 1 if len(baskets.items) else 0)
+        salts = [self._new_salt() for _ in range(self.num_hashes)]
+        self._count(salts, basket_pairs(baskets, item_to_id), s)
+
+    def add_stage(self, baskets: BasketStore, frequent_items: Iterable[int], s: int) -> None:
+        """
+        Multistage pass: rehash the pairs of frequent items that every bitmap so far admits.
+        """
+        item_to_id = dense_item_ids(baskets, frequent_items)
+        id_to_item = np.flatnonzero(item_to_id >= 0)
+        self._count([self._new_salt()], (
+            (id_to_item[i], id_to_item[j]) for i, j in self.candidate_pairs(baskets, item_to_id)
+        ), s)
+
+    def candidate_pairs(self, baskets: BasketStore, item_to_id: np.ndarray) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        basket_pairs restricted to the pairs admitted by every bitmap, still as dense ids.
+        """
+        id_to_item = np.flatnonzero(item_to_id >= 0)
+        for i, j in basket_pairs(baskets, item_to_id):
+            admitted = self.admits(id_to_item[i], id_to_item[j])
+            yield i[admitted], j[admitted]
+
+    def admits(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        """
+        Whether each item pair (i, j), i < j, hashes to a frequent bucket in every bitmap.
+        """
+        admitted = np.ones(len(i), dtype=bool)
+        for salt, bitmap in zip(self.salts, self.bitmaps):
+            buckets = self._buckets(salt, i, j)
+            admitted &= ((bitmap[buckets >> 3] >> (buckets & 7).astype(np.uint8)) & 1).astype(bool)
+        return admitted
+
+
+def pick_frequent_pairs(baskets: BasketStore, frequent_items: Iterable[int], s: int = 1,
+                        mode: str = 'auto', max_triangular_bytes: int = 1 << 30,
+                        pcy: Optional[PCYFilter] = None) -> Dict[FrozenSet[int], int]:
+    """
+    Find all the pairs of frequent items with a support greater than s.
+    baskets: the baskets, as a BasketStore (lists of sets are converted)
+    frequent_items: the frequent singletons' items
+    s: the threshold
+    mode: 'triangular', 'sparse' or 'auto', which takes the triangular array when its 4 bytes per possible pair
+          fit in max_triangular_bytes and do not exceed the 16 bytes per occurring pair of the sparse table
+    pcy: an optional PCYFilter, only the pairs it admits are counted, in the sparse table under 'auto'
+    Return the frequent pairs mapped to their support
+    """
+    if not isinstance(baskets, BasketStore):
+        baskets = BasketStore.from_baskets(baskets)
+    item_to_id = dense_item_ids(baskets, frequent_items)
+    id_to_item = np.flatnonzero(item_to_id >= 0)
+    m = len(id_to_item)
+
+    if mode == 'auto' and pcy is not None:
+        mode = 'sparse'
+    elif mode == 'auto':
+        occurrences = 0
+        for block_start in range(0, len(baskets), 1 << 16): # mapped items per basket, a block at a time
+            offsets = baskets.offsets[block_start:block_start + (1 << 16) + 1]
+            mapped = (item_to_id[baskets.items[offsets[0]:offsets[-1]]] >= 0).astype(np.int64)
+            non_empty = np.diff(offsets) > 0  # reduceat needs strictly increasing starts
+            mapped_lengths = np.add.reduceat(mapped, offsets[:-1][non_empty] - offsets[0]) if len(mapped) else mapped
+            occurrences += int((mapped_lengths * (mapped_lengths - 1) // 2).sum())
+        triangular_bytes = 4 * m * (m - 1) // 2
+        mode = 'triangular' if triangular_bytes <= min(max_triangular_bytes, 16 * occurrences) else 'sparse'
+    print(f'Counting pairs of {m} items in {mode} mode.')
+
+    if mode == 'triangular':
+        counts = count_pairs_triangular(baskets, item_to_id, m, pcy)
+        frequent = np.flatnonzero(counts > s)
+        i = np.searchsorted(np.cumsum(np.arange(m - 1, 0, -1)), frequent, side='right')  # row of every position
+        j = frequent - triangular_index(i, i + 1, m) + i + 1
+        supports = counts[frequent]
+    elif mode == 'sparse':
+        codes, counts = count_pairs_sparse(baskets, item_to_id, m, pcy)
+        if pcy is not None:
+            print(f'{len(codes)} occurring pairs admitted by {len(pcy.bitmaps)} PCY bitmaps.')
+        frequent = counts > s
+        i, j, supports = codes[frequent] // m, codes[frequent] % m, counts[frequent]
+    else:
+        raise ValueError("mode must be 'auto', 'triangular' or 'sparse'")
+
+    return {
+        frozenset((int(id_to_item[left]), int(id_to_item[right]))): int(support)
+        for left, right, support in zip(i, j, supports)
+    }